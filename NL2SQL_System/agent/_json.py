@@ -0,0 +1,25 @@
+"""Thin JSON adapter for tool payloads (orjson when available, stdlib otherwise)."""
+import json
+from typing import Any
+
+# stdlib's JSONDecodeError is the base class orjson.JSONDecodeError subclasses,
+# so callers can catch this one name for both parsers.
+JSONDecodeError = json.JSONDecodeError
+
+try:
+    import orjson
+
+    def loads(data: Any) -> Any:
+        """
+        Parse a JSON str/bytes payload.
+
+        orjson rejects the NaN/Infinity literals stdlib json emits and accepts,
+        so those payloads fall back to stdlib json.
+        """
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return json.loads(data)
+
+except ImportError:  # pragma: no cover - depends on environment
+    loads = json.loads
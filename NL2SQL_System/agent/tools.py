@@ -1,7 +1,9 @@
 """LangChain tool wrappers for MCP tools."""
 from typing import Dict, Any, List
 import ast
-import json
+from functools import lru_cache
+
+from agent import _json
 
 from mcp_tools.summarize_results import summarize_results as mcp_summarize_results
 from mcp_tools.execute_sql import execute_sql as mcp_execute_sql
@@ -31,6 +33,12 @@ def get_schema_tool(role: str = "admin") -> Dict[str, Any]:
     return result
 
 
+@lru_cache(maxsize=8)
+def _parse_schema(db_schema: str) -> Dict[str, Any]:
+    """Parse a serialized schema once; agent turns keep passing the same string."""
+    return _json.loads(db_schema)
+
+
 @tool
 def generate_sql_tool(question: str, db_schema: str) -> str:
     """
@@ -47,11 +55,10 @@ def generate_sql_tool(question: str, db_schema: str) -> str:
         Generated SQL query string
     """
     logger.info(f"LangChain tool: generate_sql_tool invoked question={str(question)[:180]}")
-    import json
 
-    # Parse schema if it's a string
+    # Parse schema if it's a string (cached: the schema is fixed within a session)
     if isinstance(db_schema, str):
-        schema_dict = json.loads(db_schema)
+        schema_dict = _parse_schema(db_schema)
     else:
         schema_dict = db_schema
 
@@ -109,8 +116,8 @@ def summarize_results_tool(question: str, results: Any) -> str:
         results_dict = results
     elif isinstance(results, str):
         try:
-            results_dict = json.loads(results)
-        except json.JSONDecodeError:
+            results_dict = _json.loads(results)
+        except _json.JSONDecodeError:
             results_dict = ast.literal_eval(results)
     else:
         raise ValueError("Invalid results payload type for summarize_results_tool")
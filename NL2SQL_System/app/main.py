@@ -1,6 +1,7 @@
 """FastAPI application for MySQL Analytical Agent."""
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional, AsyncGenerator
@@ -58,6 +59,13 @@ class HealthResponse(BaseModel):
     redis_connected: bool = False
 
 
+# SSE comment line sent while the agent is busy, so clients (30s read timeout)
+# and proxies see bytes between events
+SSE_HEARTBEAT = ": ping\n\n"
+SSE_HEARTBEAT_SECONDS = 15
+_STREAM_END = object()
+
+
 # Create FastAPI app
 app = FastAPI(
     title="MySQL Analytical Agent",
@@ -79,6 +87,10 @@ app.add_middleware(
         ",") if settings.cors_allow_headers != "*" else ["*"],
 )
 
+# Compress schema/query JSON for clients that ask for it; the SSE client
+# requests identity encoding so stream events aren't buffered by gzip
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
 
 # Global agent instance
 agent = None
@@ -226,7 +238,17 @@ async def query_database_stream(request: QueryRequest):
         try:
             if agent is None:
                 raise RuntimeError("Agent is not initialized")
-            for event in agent.query_stream(request.question, role=user["role"]):
+            events = agent.query_stream(request.question, role=user["role"])
+            while True:
+                # The agent stream is synchronous (LLM/DB calls); advance it in a
+                # worker thread so the event loop stays free to send heartbeats.
+                next_event = asyncio.ensure_future(asyncio.to_thread(next, events, _STREAM_END))
+                while not (await asyncio.wait({next_event}, timeout=SSE_HEARTBEAT_SECONDS))[0]:
+                    yield SSE_HEARTBEAT
+                event = next_event.result()
+                if event is _STREAM_END:
+                    break
+
                 # Format as SSE: data: {json}\n\n
                 event_data = json.dumps(event)
                 yield f"data: {event_data}\n\n"
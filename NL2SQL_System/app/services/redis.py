@@ -1,6 +1,8 @@
 """
 Redis service wrapper for session management.
 """
+from typing import Dict, List, Optional
+
 import redis
 from loguru import logger
 from app.config import settings
@@ -71,6 +73,14 @@ class RedisService:
         if not self.client:
             return False
 
+        try:
+            key = f"token:{token}"
+            self.client.delete(key)
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting token from Redis: {e}")
+            return False
+
     def set_pii_mapping(self, token: str, encrypted_value: str, expiry_seconds: int = 86400) -> bool:
         """Store PII token -> encrypted value mapping."""
         if not self.client:
@@ -84,6 +94,23 @@ class RedisService:
             logger.error(f"Error storing PII mapping in Redis: {e}")
             return False
 
+    def set_pii_mappings(self, mappings: Dict[str, str], expiry_seconds: int = 86400) -> bool:
+        """Store many PII token -> encrypted value mappings in one pipelined round-trip."""
+        if not self.client:
+            logger.warning("Redis not connected, skipping PII mapping storage")
+            return False
+        if not mappings:
+            return True
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for token, encrypted_value in mappings.items():
+                pipe.setex(f"pii:{token}", expiry_seconds, encrypted_value)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error storing PII mappings in Redis: {e}")
+            return False
+
     def get_pii_mapping(self, token: str) -> str:
         """Retrieve encrypted value for a given PII token."""
         if not self.client:
@@ -94,14 +121,16 @@ class RedisService:
         except Exception as e:
             logger.error(f"Error retrieving PII mapping from Redis: {e}")
             return None
-            
+
+    def get_pii_mappings(self, tokens: List[str]) -> List[Optional[str]]:
+        """Retrieve encrypted values for many PII tokens with a single MGET."""
+        if not self.client or not tokens:
+            return [None] * len(tokens)
         try:
-            key = f"token:{token}"
-            self.client.delete(key)
-            return True
+            return self.client.mget([f"pii:{token}" for token in tokens])
         except Exception as e:
-            logger.error(f"Error deleting token from Redis: {e}")
-            return False
+            logger.error(f"Error retrieving PII mappings from Redis: {e}")
+            return [None] * len(tokens)
 
 
 # Global Redis instance
@@ -1,4 +1,9 @@
-from cryptography.fernet import Fernet
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+import base64
 import os
 from dotenv import load_dotenv
 
@@ -12,12 +17,32 @@ if not _fernet_key:
     # In production, this would lead to data loss if server restarts
     _fernet_key = Fernet.generate_key().decode()
 
+# PII_ENCRYPTION_KEY stays a Fernet-format key (urlsafe base64 of 32 bytes).
+# The AES-256-GCM key is derived from it with HKDF so the two ciphers never
+# share key material.
 fernet = Fernet(_fernet_key.encode())
+_GCM_KEY_INFO = b"nl2sql-pii-aes-256-gcm"
+_aead = AESGCM(
+    HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=_GCM_KEY_INFO)
+    .derive(base64.urlsafe_b64decode(_fernet_key.encode()))
+)
+_NONCE_SIZE = 12
 
 def encrypt_value(value: str) -> str:
-    """Encrypt a string value using Fernet."""
-    return fernet.encrypt(value.encode()).decode()
+    """Encrypt a string value using AES-256-GCM (nonce-prefixed, urlsafe base64)."""
+    nonce = os.urandom(_NONCE_SIZE)
+    ciphertext = _aead.encrypt(nonce, value.encode(), None)
+    return base64.urlsafe_b64encode(nonce + ciphertext).decode()
 
 def decrypt_value(token: str) -> str:
-    """Decrypt a Fernet token back to string."""
-    return fernet.decrypt(token.encode()).decode()
+    """Decrypt a value produced by encrypt_value (or a legacy Fernet token) back to string."""
+    try:
+        raw = base64.urlsafe_b64decode(token.encode())
+        return _aead.decrypt(raw[:_NONCE_SIZE], raw[_NONCE_SIZE:], None).decode()
+    except (InvalidTag, ValueError):
+        # Mappings stored in Redis or the token file before the switch to
+        # AES-GCM are Fernet tokens.
+        try:
+            return fernet.decrypt(token.encode()).decode()
+        except InvalidToken:
+            raise ValueError("Invalid encrypted PII value")
@@ -1,41 +1,85 @@
 import re
 from privacy.config import decrypt_value
 from privacy.encoder import _token_store, get_persisted_token
-from typing import Any, Dict
+from typing import AbstractSet, Any, Dict, Iterable, List, Optional, Set
 from app.services.redis import redis_client
 
+# Regex to find tokens like [PERSON_A1B2C3D4]
+_TOKEN_RE = re.compile(r"\[[A-Z_]+_[0-9A-F]{8}\]")
+
+def _lookup_encrypted(token: str, check_redis: bool = True) -> Optional[str]:
+    """Find the encrypted value for a token (memory, then Redis, then local file)."""
+    encrypted_val = _token_store.get(token)
+    if not encrypted_val and check_redis and redis_client.is_connected:
+        encrypted_val = redis_client.get_pii_mapping(token)
+        if encrypted_val:
+            _token_store[token] = encrypted_val
+    if not encrypted_val:
+        encrypted_val = get_persisted_token(token)
+        if encrypted_val:
+            _token_store[token] = encrypted_val
+    return encrypted_val
+
+
+def _resolve_token(token: str, check_redis: bool = True) -> str:
+    """Return the original value for a token, or the token itself on a miss."""
+    encrypted_val = _lookup_encrypted(token, check_redis)
+    if not encrypted_val:
+        return token
+    try:
+        return decrypt_value(encrypted_val)
+    except Exception as e:
+        # If decryption fails for some reason, keep the token
+        print(f"Error decoding token {token}: {e}")
+        return token
+
+
 def decode_text(text: str) -> str:
     """
     Finds PII tokens in text and replaces them with decrypted original values.
     Pattern: [ENTITY_TYPE_HASH]
     """
-    decoded_text = text
-    
-    # Regex to find tokens like [PERSON_A1B2C3D4]
-    token_pattern = r"\[[A-Z_]+_[0-9A-F]{8}\]"
-    tokens_found = re.findall(token_pattern, text)
-    
-    # Sort by length descending to avoid partial matching if tokens varied in length
-    # (though they are fixed 8-char hashes here)
-    for token in set(tokens_found):
-        encrypted_val = _token_store.get(token)
-        if not encrypted_val and redis_client.is_connected:
-            encrypted_val = redis_client.get_pii_mapping(token)
-            if encrypted_val:
-                _token_store[token] = encrypted_val
-        if not encrypted_val:
-            encrypted_val = get_persisted_token(token)
-            if encrypted_val:
-                _token_store[token] = encrypted_val
+    return _decode_text(text, frozenset())
+
+
+def _decode_text(text: str, redis_checked: AbstractSet[str]) -> str:
+    """decode_text, skipping the Redis lookup for tokens in redis_checked."""
+    # Each distinct token is resolved once; the text is scanned in a single pass.
+    resolved: Dict[str, str] = {}
+
+    def _replace(match: "re.Match") -> str:
+        token = match.group(0)
+        original_val = resolved.get(token)
+        if original_val is None:
+            original_val = resolved[token] = _resolve_token(token, token not in redis_checked)
+        return original_val
+
+    return _TOKEN_RE.sub(_replace, text)
+
+
+def _prefetch_tokens(texts: Iterable[str]) -> Set[str]:
+    """
+    Load Redis mappings for every unknown token in texts with a single MGET,
+    so the per-cell decode calls below are served from _token_store.
+
+    Returns the tokens looked up in Redis; MGET misses among them go
+    straight to the local file instead of a second per-token GET.
+    """
+    if not redis_client.is_connected:
+        return set()
+    missing = {
+        token
+        for text in texts
+        for token in _TOKEN_RE.findall(text)
+        if token not in _token_store
+    }
+    if not missing:
+        return missing
+    tokens = list(missing)
+    for token, encrypted_val in zip(tokens, redis_client.get_pii_mappings(tokens)):
         if encrypted_val:
-            try:
-                original_val = decrypt_value(encrypted_val)
-                decoded_text = decoded_text.replace(token, original_val)
-            except Exception as e:
-                # If decryption fails for some reason, keep the token or mark error
-                print(f"Error decoding token {token}: {e}")
-                
-    return decoded_text
+            _token_store[token] = encrypted_val
+    return missing
 
 
 def decode_results(result: Any) -> Any:
@@ -49,40 +93,40 @@ def decode_results(result: Any) -> Any:
     if result is None:
         return result
 
+    # Repeated cell values (e.g. the same customer across orders) decode once
+    decoded_cache: Dict[str, str] = {}
+    redis_checked: Set[str] = set()
+
+    def _decode(val: Any) -> Any:
+        # Non-strings and strings without a "[" cannot hold a token
+        if not isinstance(val, str) or "[" not in val:
+            return val
+        decoded_val = decoded_cache.get(val)
+        if decoded_val is None:
+            decoded_val = decoded_cache[val] = _decode_text(val, redis_checked)
+        return decoded_val
+
+    def _decode_rows(rows: List[List[Any]]) -> List[List[Any]]:
+        redis_checked.update(
+            _prefetch_tokens(val for row in rows for val in row if isinstance(val, str))
+        )
+        return [[_decode(val) for val in row] for row in rows]
+
     # Dict with columns/rows
     if isinstance(result, dict) and "rows" in result:
-        rows = result.get("rows", [])
-        decoded_rows = []
-        for row in rows:
-            decoded_row = []
-            for val in row:
-                if isinstance(val, str):
-                    decoded_row.append(decode_text(val))
-                else:
-                    decoded_row.append(val)
-            decoded_rows.append(decoded_row)
         decoded = dict(result)
-        decoded["rows"] = decoded_rows
+        decoded["rows"] = _decode_rows(result.get("rows", []))
         return decoded
 
     # List of dicts
     if isinstance(result, list) and result and isinstance(result[0], dict):
-        decoded_list = []
-        for item in result:
-            decoded_item = {}
-            for k, v in item.items():
-                decoded_item[k] = decode_text(v) if isinstance(v, str) else v
-            decoded_list.append(decoded_item)
-        return decoded_list
+        redis_checked.update(
+            _prefetch_tokens(v for item in result for v in item.values() if isinstance(v, str))
+        )
+        return [{k: _decode(v) for k, v in item.items()} for item in result]
 
     # List of lists
     if isinstance(result, list) and result and isinstance(result[0], list):
-        decoded_list = []
-        for row in result:
-            decoded_row = []
-            for val in row:
-                decoded_row.append(decode_text(val) if isinstance(val, str) else val)
-            decoded_list.append(decoded_row)
-        return decoded_list
+        return _decode_rows(result)
 
     return result
@@ -1,12 +1,15 @@
+import atexit
+import bisect
 import hashlib
-import json
 import os
 import threading
 import re
-from typing import Dict, List, Tuple, Any
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple, Any
 from privacy.config import encrypt_value
 from presidio_analyzer import AnalyzerEngine, PatternRecognizer, Pattern, RecognizerRegistry
 from presidio_analyzer.nlp_engine import NlpEngineProvider
+import orjson
 from loguru import logger
 from app.services.redis import redis_client
 
@@ -79,30 +82,36 @@ def get_analyzer():
             _analyzer = "fallback"
     return _analyzer
 
+# Regex fallback patterns used when the Presidio models are unavailable.
+# They are fused into one alternation so the text is scanned once; at a given
+# position earlier alternatives win, so the more specific patterns come first.
+# Only leftmost matches compete that way, so PHONE_NUMBER must start on "+" or a
+# digit; otherwise it would match from the space before an Aadhaar number.
+_FALLBACK_PATTERN_SOURCES = {
+    "EMAIL_ADDRESS": r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}",
+    "IN_AADHAAR": r"\b\d{4}\s?\d{4}\s?\d{4}\b",
+    "ORGANIZATION": r"\b[A-Z][A-Za-z&.'-]+(?:\s+[A-Z][A-Za-z&.'-]+)*\s+(Group|Ltd|Limited|LLC|Inc|Corp|Corporation|Company|Co\.|Technologies|Solutions|Systems|Enterprises)\b",
+    "PHONE_NUMBER": r"\+?\d[\d\s-]{8,}\d",
+    "PERSON": r"\b[A-Z][a-z]+ [A-Z][a-z]+\b",  # Very basic name-like pattern
+}
+_FALLBACK_UNION = re.compile(
+    "|".join(f"(?P<{entity_type}>{pattern})" for entity_type, pattern in _FALLBACK_PATTERN_SOURCES.items())
+)
+
 def _regex_detect_pii(text: str) -> List[Dict[str, Any]]:
     """Simple regex fallback for PII detection when models are missing."""
-    import re
-    patterns = {
-        "PHONE_NUMBER": r"\+?[\d\s-]{10,}",
-        "EMAIL_ADDRESS": r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}",
-        "PERSON": r"\b[A-Z][a-z]+ [A-Z][a-z]+\b",  # Very basic name-like pattern
-        "ORGANIZATION": r"\b[A-Z][A-Za-z&.'-]+(?:\s+[A-Z][A-Za-z&.'-]+)*\s+(Group|Ltd|Limited|LLC|Inc|Corp|Corporation|Company|Co\.|Technologies|Solutions|Systems|Enterprises)\b",
-        "IN_AADHAAR": r"\b\d{4}\s?\d{4}\s?\d{4}\b",
-    }
-    
-    entities = []
-    for entity_type, pattern in patterns.items():
-        for match in re.finditer(pattern, text):
-            entities.append({
-                "entity_type": entity_type,
-                "start": match.start(),
-                "end": match.end(),
-                "score": 0.5
-            })
-    return entities
+    return [
+        {
+            "entity_type": match.lastgroup,
+            "start": match.start(),
+            "end": match.end(),
+            "score": 0.5
+        }
+        for match in _FALLBACK_UNION.finditer(text)
+    ]
 
 # In-memory store for tokens -> encrypted_values
-# Format: { "TOKEN_HASH": "FERNET_ENCRYPTED_ORIGINAL_VALUE" }
+# Format: { "TOKEN_HASH": "ENCRYPTED_ORIGINAL_VALUE" }
 _token_store: Dict[str, str] = {}
 _PII_TTL_SECONDS = 86400
 _TOKEN_FILE = os.path.join(os.path.dirname(__file__), ".token_store.json")
@@ -119,6 +128,13 @@ _SAFE_RESULT_COLUMNS = {
     "order_status",
 }
 
+# Cheap trigger check run before Presidio on result cells: every configured
+# entity pattern needs an uppercase letter, an "@", or at least 10 digits.
+# Digits are counted across the separators phone formats use (spaces, dots,
+# dashes, parentheses, "+"), so "(502)660-6474x6872" and "486.880.1128x059"
+# still reach Presidio while dates such as "2024-05-22" do not.
+_MAYBE_PII_RE = re.compile(r"[A-Z@]|(?:\d[\s().+-]*){9}\d")
+
 
 def _is_low_risk_result_column(column_name: str) -> bool:
     col = (column_name or "").strip().lower()
@@ -148,6 +164,10 @@ def _is_pii_candidate_text(value: str) -> bool:
     # Tiny tokens are unlikely to carry meaningful PII
     if len(s) < 3:
         return False
+    # Needs a capital letter, an "@", or a phone/ID-length digit run;
+    # lowercase free text such as status/enum codes is skipped.
+    if not _MAYBE_PII_RE.search(s):
+        return False
     return True
 
 
@@ -155,30 +175,68 @@ def _load_token_file() -> Dict[str, str]:
     if not os.path.exists(_TOKEN_FILE):
         return {}
     try:
-        with _TOKEN_FILE_LOCK, open(_TOKEN_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        with open(_TOKEN_FILE, "rb") as f:
+            data = orjson.loads(f.read())
             return data if isinstance(data, dict) else {}
     except Exception:
         return {}
 
 
+# Persisted mappings are read once at import and served from memory; writes
+# update this dict and schedule a debounced flush back to _TOKEN_FILE.
+_TOKEN_CACHE: Dict[str, str] = _load_token_file()
+_TOKEN_FLUSH_DELAY_SECONDS = 1.0
+_flush_timer: Optional[threading.Timer] = None
+
+
+def _flush_token_file() -> None:
+    """Write the token cache to disk atomically if there are pending changes."""
+    global _flush_timer
+    with _TOKEN_FILE_LOCK:
+        if _flush_timer is None:
+            return
+        _flush_timer.cancel()
+        _flush_timer = None
+        try:
+            tmp_file = f"{_TOKEN_FILE}.tmp"
+            with open(tmp_file, "wb") as f:
+                f.write(orjson.dumps(_TOKEN_CACHE))
+            os.replace(tmp_file, _TOKEN_FILE)
+        except Exception:
+            # Best-effort persistence
+            pass
+
+
+atexit.register(_flush_token_file)
+
+
+def _schedule_token_flush() -> None:
+    """Mark the token cache dirty and start the debounced flush if needed."""
+    global _flush_timer
+    with _TOKEN_FILE_LOCK:
+        if _flush_timer is None:
+            _flush_timer = threading.Timer(_TOKEN_FLUSH_DELAY_SECONDS, _flush_token_file)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+
+
+def _persist_tokens(mappings: Dict[str, str]) -> None:
+    """Persist token mappings locally (encrypted values only)."""
+    if not mappings:
+        return
+    with _TOKEN_FILE_LOCK:
+        _TOKEN_CACHE.update(mappings)
+    _schedule_token_flush()
+
+
 def _persist_token(token: str, encrypted_val: str) -> None:
     """Persist token mapping locally (encrypted values only)."""
-    try:
-        with _TOKEN_FILE_LOCK:
-            data = _load_token_file()
-            data[token] = encrypted_val
-            with open(_TOKEN_FILE, "w", encoding="utf-8") as f:
-                json.dump(data, f)
-    except Exception:
-        # Best-effort persistence
-        pass
+    _persist_tokens({token: encrypted_val})
 
 
 def get_persisted_token(token: str) -> str:
     """Retrieve persisted token mapping if available."""
-    data = _load_token_file()
-    return data.get(token)
+    return _TOKEN_CACHE.get(token)
 
 def detect_pii(text: str) -> List[Dict[str, Any]]:
     """
@@ -265,6 +323,77 @@ def _expand_person_entities(text: str, entities: List[Dict[str, Any]]) -> List[D
 
     return deduped
 
+# Result cells are analyzed together, joined by a separator that spaCy treats
+# as a paragraph break and that whitespace-based recognizer regexes cannot
+# cross. Chunks stay well below spaCy's default max_length.
+_BATCH_SEPARATOR = "\n\u2063\n"
+_BATCH_MAX_CHARS = 100_000
+
+
+def _chunk_texts(texts: List[str]) -> Iterator[List[str]]:
+    chunk: List[str] = []
+    size = 0
+    for text in texts:
+        if chunk and size + len(text) > _BATCH_MAX_CHARS:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(text)
+        size += len(text) + len(_BATCH_SEPARATOR)
+    if chunk:
+        yield chunk
+
+
+def _analyze_batch(analyzer: Any, texts: List[str]) -> List[List[Dict[str, Any]]]:
+    """Run one analyzer call over the joined texts and map entities back per text."""
+    offsets = []
+    pos = 0
+    for text in texts:
+        offsets.append(pos)
+        pos += len(text) + len(_BATCH_SEPARATOR)
+
+    try:
+        results = analyzer.analyze(
+            text=_BATCH_SEPARATOR.join(texts), language='en', entities=PII_ENTITIES
+        )
+    except Exception as e:
+        logger.error(f"Batched PII detection failed: {e}")
+        return [detect_pii(text) for text in texts]
+
+    per_text: List[List[Dict[str, Any]]] = [[] for _ in texts]
+    for res in results:
+        # A span may start inside a separator or run across one; split it into
+        # one entity per cell it overlaps so no part of it is left unmasked.
+        idx = bisect.bisect_right(offsets, res.start) - 1
+        while idx < len(texts) and offsets[idx] < res.end:
+            start = max(res.start - offsets[idx], 0)
+            end = min(res.end - offsets[idx], len(texts[idx]))
+            if start < end:
+                per_text[idx].append({
+                    "entity_type": res.entity_type,
+                    "start": start,
+                    "end": end,
+                    "score": res.score
+                })
+            idx += 1
+    return [_expand_person_entities(text, ents) for text, ents in zip(texts, per_text)]
+
+
+def detect_pii_batch(texts: List[str]) -> List[List[Dict[str, Any]]]:
+    """
+    Detect PII in many texts, amortizing the Presidio/spaCy pipeline over
+    one analyzer call per chunk. Returns one entity list per input text.
+    """
+    analyzer = get_analyzer()
+
+    if analyzer == "fallback":
+        return [_regex_detect_pii(text) for text in texts]
+
+    detected: List[List[Dict[str, Any]]] = []
+    for chunk in _chunk_texts(texts):
+        detected.extend(_analyze_batch(analyzer, chunk))
+    return detected
+
+@lru_cache(maxsize=1 << 16)
 def get_token_hash(value: str, entity_type: str) -> str:
     """Generate a unique but safe-looking token using SHA-256."""
     hash_obj = hashlib.sha256(value.encode())
@@ -272,6 +401,13 @@ def get_token_hash(value: str, entity_type: str) -> str:
     short_hash = hash_obj.hexdigest()[:8].upper()
     return f"[{entity_type}_{short_hash}]"
 
+def _encrypt_for_token(token: str, value: str) -> str:
+    """Return the stored ciphertext for a token, encrypting the value only on first sight."""
+    encrypted_val = _token_store.get(token)
+    if encrypted_val is None:
+        encrypted_val = _token_store[token] = encrypt_value(value)
+    return encrypted_val
+
 def encode_query(text: str) -> Tuple[str, List[Dict]]:
     """
     Analyzes text, replaces PII with tokens, and stores encrypted maps.
@@ -292,10 +428,8 @@ def encode_query(text: str) -> Tuple[str, List[Dict]]:
         entity_type = res['entity_type']
         
         token = get_token_hash(original_value, entity_type)
-        encrypted_val = encrypt_value(original_value)
-        
         # Store in bridge
-        _token_store[token] = encrypted_val
+        encrypted_val = _encrypt_for_token(token, original_value)
         if redis_client.is_connected:
             redis_client.set_pii_mapping(token, encrypted_val, _PII_TTL_SECONDS)
         else:
@@ -322,7 +456,27 @@ def encode_results(columns: List[str], rows: List[List[Any]]) -> List[List[Any]]
         if _is_low_risk_result_column(col)
     }
 
+    # Analyze every distinct candidate string up front in batched analyzer
+    # calls (repeated values across rows are analyzed once)
+    detected: Dict[str, List[Dict[str, Any]]] = {}
+    pending: List[str] = []
+    for row in rows:
+        for idx, val in enumerate(row):
+            if (
+                isinstance(val, str)
+                and idx not in safe_idx
+                and val not in detected
+                and _is_pii_candidate_text(val)
+            ):
+                detected[val] = []
+                pending.append(val)
+    if pending:
+        for val, entities in zip(pending, detect_pii_batch(pending)):
+            detected[val] = entities
+
     encoded_rows = []
+    # Mappings are written in one batch after the scan instead of per token
+    new_mappings: Dict[str, str] = {}
     masked_cells = 0
     scanned_strings = 0
     for row in rows:
@@ -333,20 +487,15 @@ def encode_results(columns: List[str], rows: List[List[Any]]) -> List[List[Any]]
                 if idx in safe_idx or not _is_pii_candidate_text(val):
                     encoded_row.append(val)
                     continue
-                # Use detect_pii on the string
-                entities = detect_pii(val)
+                entities = detected.get(val)
                 if entities:
                     # Sort in reverse to replace
                     entities.sort(key=lambda x: x['start'], reverse=True)
                     ev = val
                     for ent in entities:
-                        token = get_token_hash(val[ent['start']:ent['end']], ent['entity_type'])
-                        encrypted_val = encrypt_value(val[ent['start']:ent['end']])
-                        _token_store[token] = encrypted_val
-                        if redis_client.is_connected:
-                            redis_client.set_pii_mapping(token, encrypted_val, _PII_TTL_SECONDS)
-                        else:
-                            _persist_token(token, encrypted_val)
+                        original_value = val[ent['start']:ent['end']]
+                        token = get_token_hash(original_value, ent['entity_type'])
+                        new_mappings[token] = _encrypt_for_token(token, original_value)
                         ev = ev[:ent['start']] + token + ev[ent['end']:]
                     masked_cells += 1
                     encoded_row.append(ev)
@@ -355,6 +504,11 @@ def encode_results(columns: List[str], rows: List[List[Any]]) -> List[List[Any]]
             else:
                 encoded_row.append(val)
         encoded_rows.append(encoded_row)
+    if new_mappings:
+        if redis_client.is_connected:
+            redis_client.set_pii_mappings(new_mappings, _PII_TTL_SECONDS)
+        else:
+            _persist_tokens(new_mappings)
     logger.info(
         f"Result PII masking summary: rows={len(rows)}, scanned_strings={scanned_strings}, masked_cells={masked_cells}"
     )
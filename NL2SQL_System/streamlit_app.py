@@ -10,14 +10,25 @@ Version: 2.0
 
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 import json
+import orjson
 import os
-import pandas as pd
 import random
-from typing import Dict, Any, Optional, Generator, List
+import re
+import sys
+import time
+import uuid
+from typing import TYPE_CHECKING, Dict, Any, Optional, Generator, Iterable, Iterator, List, Tuple
 from dotenv import load_dotenv
 from datetime import datetime
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
@@ -34,8 +45,59 @@ if API_HOST == "0.0.0.0":
 
 API_BASE_URL = f"http://{API_HOST}:{API_PORT}"
 
-# History persistence (simple local JSON file)
-HISTORY_FILE = os.path.join(os.path.dirname(__file__), "chat_history.json")
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """
+    Shared HTTP session for backend calls.
+
+    Cached as a resource so the keep-alive connection pool survives
+    Streamlit reruns (the script body re-executes on every interaction).
+    GETs are retried on transient gateway errors; POSTs only on connect errors.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=10,
+        max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Backend auth helper, imported once (the UI still loads without it)
+_APP_DIR = os.path.dirname(__file__)
+if _APP_DIR not in sys.path:
+    sys.path.insert(0, _APP_DIR)
+try:
+    from app.auth import create_jwt_token
+except Exception as e:
+    print(f"Warning: Could not import backend auth module: {e}")
+    create_jwt_token = None
+
+_JWT_REFRESH_SECONDS = 3600
+
+# pandas is imported on first use to keep it off the cold-start path
+_pd = None
+
+
+def _get_pd():
+    """Return the pandas module, importing it on first call."""
+    global _pd
+    if _pd is None:
+        import pandas
+        _pd = pandas
+    return _pd
+
+
+# History persistence: one append-only JSONL file per chat plus a small index
+HISTORY_DIR = os.getenv("CHAT_HISTORY_DIR", os.path.join(os.path.dirname(__file__), "chat_history"))
+HISTORY_INDEX = os.path.join(HISTORY_DIR, "index.json")
+# Single-file store used before per-chat JSONL; migrated on first load
+HISTORY_FILE = os.getenv("CHAT_HISTORY_FILE", os.path.join(os.path.dirname(__file__), "chat_history.json"))
+# Only the most recent messages keep their full result data on disk
+HISTORY_FULL_DATA_MESSAGES = 5
 
 
 def _new_chat(title: str = "New chat") -> Dict[str, Any]:
@@ -48,33 +110,165 @@ def _new_chat(title: str = "New chat") -> Dict[str, Any]:
     }
 
 
+def _chat_file(chat_id: str) -> str:
+    return os.path.join(HISTORY_DIR, f"{chat_id}.jsonl")
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp_file = f"{path}.tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(data)
+    os.replace(tmp_file, path)
+
+
+def _iter_messages(chat_id: str) -> Iterator[Dict[str, Any]]:
+    """Stream a chat's messages from its JSONL file, skipping unreadable lines."""
+    try:
+        with open(_chat_file(chat_id), "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    yield orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    # e.g. a line torn by a crash mid-append
+                    continue
+    except FileNotFoundError:
+        return
+
+
+def _load_legacy_history() -> Optional[List[Dict[str, Any]]]:
+    """Read chats from the old single-file store, if present."""
+    if not os.path.exists(HISTORY_FILE):
+        return None
+    with open(HISTORY_FILE, "rb") as f:
+        data = orjson.loads(f.read())
+    # Backward compatibility: old format was a list of messages
+    if isinstance(data, list):
+        chat = _new_chat("Chat 1")
+        chat["messages"] = data
+        return [chat]
+    if isinstance(data, dict) and "chats" in data:
+        return data["chats"]
+    return None
+
+
 def load_history() -> Dict[str, Any]:
     """Load persisted chat history from disk."""
+    # True while a non-empty index exists on disk: a failed load must not
+    # replace it with a fresh one, which would orphan every chat file it lists
+    keep_index = False
     try:
-        if os.path.exists(HISTORY_FILE):
-            with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                # Backward compatibility: old format was a list of messages
-                if isinstance(data, list):
-                    chat = _new_chat("Chat 1")
-                    chat["messages"] = data
-                    return {"chats": [chat]}
-                if isinstance(data, dict) and "chats" in data:
-                    return data
+        if os.path.exists(HISTORY_INDEX):
+            keep_index = True
+            with open(HISTORY_INDEX, "rb") as f:
+                index = orjson.loads(f.read())
+            chats = []
+            for entry in index:
+                try:
+                    messages = list(_iter_messages(entry["id"]))
+                except OSError:
+                    # Keep an unreadable chat listed (and its file untouched)
+                    chats.append({**entry, "messages": []})
+                    continue
+                # "handled" is written with the user message (False) and never
+                # rewritten; any user message that got a reply was handled.
+                for message, _reply in zip(messages, messages[1:]):
+                    if message.get("role") == "user":
+                        message["handled"] = True
+                # Compact the chat file once older messages carry full result data
+                if _trim_old_data(messages):
+                    _write_chat(entry["id"], messages)
+                chats.append({**entry, "messages": messages})
+            if chats:
+                return {"chats": chats}
+            keep_index = False
+
+        chats = _load_legacy_history()
+        if chats:
+            for chat in chats:
+                _trim_old_data(chat.get("messages", []))
+            _write_history(chats)
+            return {"chats": chats}
+    except Exception:
+        pass
+
+    chats = [_new_chat("Chat 1")]
+    if not keep_index:
+        save_chat_index(chats)
+    return {"chats": chats}
+
+
+def save_chat_index(chats: List[Dict[str, Any]]) -> None:
+    """Persist chat ids, titles and creation times (best-effort, atomic replace)."""
+    try:
+        os.makedirs(HISTORY_DIR, exist_ok=True)
+        index = [
+            {"id": chat["id"], "title": chat.get("title", "Chat"), "created_at": chat.get("created_at")}
+            for chat in chats
+        ]
+        _write_atomic(HISTORY_INDEX, orjson.dumps(index))
     except Exception:
         pass
-    return {"chats": [_new_chat("Chat 1")]}
 
 
-def save_history(chats: List[Dict[str, Any]]) -> None:
-    """Persist chat history to disk (best-effort)."""
+def append_message(chat_id: str, message: Dict[str, Any]) -> None:
+    """Append one message to a chat's JSONL file (best-effort)."""
+    try:
+        os.makedirs(HISTORY_DIR, exist_ok=True)
+        with open(_chat_file(chat_id), "ab") as f:
+            f.write(orjson.dumps(message) + b"\n")
+    except Exception:
+        pass
+
+
+def delete_chat(chat_id: str, chats: List[Dict[str, Any]]) -> None:
+    """Remove a chat's message file and persist the remaining chats' index."""
+    try:
+        os.remove(_chat_file(chat_id))
+    except OSError:
+        pass
+    save_chat_index(chats)
+
+
+def _trim_old_data(messages: List[Dict[str, Any]]) -> bool:
+    """
+    Replace result data on all but the last HISTORY_FULL_DATA_MESSAGES messages
+    with a {"__truncated__": True, "row_count": n} marker.
+
+    Returns:
+        True if any message was trimmed
+    """
+    trimmed = False
+    for message in messages[:-HISTORY_FULL_DATA_MESSAGES]:
+        data = message.get("data")
+        if not data or (isinstance(data, dict) and data.get("__truncated__")):
+            continue
+        if isinstance(data, dict):
+            row_count = data.get("row_count", len(data.get("rows") or []))
+        else:
+            row_count = len(data) if isinstance(data, list) else 0
+        message["data"] = {"__truncated__": True, "row_count": row_count}
+        trimmed = True
+    return trimmed
+
+
+def _write_chat(chat_id: str, messages: List[Dict[str, Any]]) -> None:
+    """Rewrite one chat's JSONL file (best-effort, atomic replace)."""
     try:
-        with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-            json.dump({"chats": chats}, f)
+        os.makedirs(HISTORY_DIR, exist_ok=True)
+        _write_atomic(_chat_file(chat_id), b"".join(orjson.dumps(m) + b"\n" for m in messages))
     except Exception:
         pass
 
 
+def _write_history(chats: List[Dict[str, Any]]) -> None:
+    """Rewrite every chat file and the index (used to migrate the legacy store)."""
+    for chat in chats:
+        _write_chat(chat["id"], chat.get("messages", []))
+    save_chat_index(chats)
+
+
 def get_active_chat() -> Optional[Dict[str, Any]]:
     chat_id = st.session_state.get("active_chat_id")
     if not chat_id:
@@ -94,24 +288,39 @@ def get_jwt_token(role: str = "viewer") -> str:
     """
     Generate a JWT token for authentication.
 
+    Tokens are cached per role across reruns and refreshed every
+    _JWT_REFRESH_SECONDS, well inside the backend's 24h expiry.
+
     Args:
         role: User role ('admin' or 'viewer')
 
     Returns:
         Signed JWT token string
     """
+    if create_jwt_token is None:
+        print("Warning: Could not generate JWT token: backend auth module unavailable")
+        return None
     try:
-        # Import from the backend auth module
-        import sys
-        sys.path.insert(0, os.path.dirname(__file__))
-        from app.auth import create_jwt_token
-        return create_jwt_token(f"streamlit_user", role)
+        return _cached_jwt_token(role)
     except Exception as e:
-        # If import fails, return None and handle gracefully
+        # If token creation fails, return None and handle gracefully
         print(f"Warning: Could not generate JWT token: {e}")
         return None
 
 
+@st.cache_data(ttl=_JWT_REFRESH_SECONDS, show_spinner=False)
+def _cached_jwt_token(role: str) -> str:
+    return create_jwt_token("streamlit_user", role)
+
+
+# Story-mode follow-up triggers, matched against the words of the last question
+_WORD_RE = re.compile(r"\w+")
+_KW_REVENUE = frozenset({"revenue", "revenues", "sales", "income", "profit", "profits"})
+_KW_CUSTOMER = frozenset({"customer", "customers", "user", "users", "client", "clients"})
+_KW_PRODUCT = frozenset({"product", "products", "item", "items", "stock", "stocks", "inventory"})
+_KW_ORDER = frozenset({"order", "orders", "transaction", "transactions"})
+
+
 def generate_insights(schema: Dict[str, Any], role: str, last_question: Optional[str] = None) -> List[str]:
     """
     Generate contextual insight questions based on schema structure and user role.
@@ -126,9 +335,30 @@ def generate_insights(schema: Dict[str, Any], role: str, last_question: Optional
     if not schema or "tables" not in schema:
         return ["How many records are in the database?"]
 
+    # Only table and column names matter, so they form the cache key; this is
+    # much cheaper for st.cache_data to hash than the full schema dict
+    tables_key = tuple(
+        (table["name"], tuple(c["name"] for c in table.get("columns", [])))
+        for table in schema["tables"]
+    )
+    candidates = list(_generate_insights_cached(tables_key, role, last_question))
+    if not candidates:
+        return ["How many records are in the database?"]
+
+    # Shuffle outside the cache so every call gets a fresh pick
+    random.shuffle(candidates)
+    return candidates[:4]
+
+
+@st.cache_data(ttl=1800, show_spinner=False)
+def _generate_insights_cached(
+    tables_key: Tuple[Tuple[str, Tuple[str, ...]], ...],
+    role: str,
+    last_question: Optional[str]
+) -> Tuple[str, ...]:
     insights = []
-    tables = [table["name"] for table in schema["tables"]]
-    table_set = set(tables)
+    table_columns = dict(tables_key)
+    table_set = set(table_columns)
 
     # Base insights (safe for all users)
     if "orders" in table_set:
@@ -144,46 +374,43 @@ def generate_insights(schema: Dict[str, Any], role: str, last_question: Optional
     # Admin-only insights (deeper, operational)
     if role == "admin":
         if "products" in table_set:
-            products_table = next(
-                (t for t in schema["tables"] if t["name"] == "products"), None)
-            if products_table:
-                product_cols = [c["name"] for c in products_table["columns"]]
-                if "price" in product_cols and "cost" in product_cols:
-                    insights.append("Which products have the lowest margin?")
-                if "stock_quantity" in product_cols and "reorder_level" in product_cols:
-                    insights.append(
-                        "Which products are close to reorder level?")
+            product_cols = table_columns["products"]
+            if "price" in product_cols and "cost" in product_cols:
+                insights.append("Which products have the lowest margin?")
+            if "stock_quantity" in product_cols and "reorder_level" in product_cols:
+                insights.append(
+                    "Which products are close to reorder level?")
 
         if "suppliers" in table_set and "orders" in table_set:
             insights.append("Are there suppliers with delayed lead times?")
 
     # Story Mode: Context-aware follow-ups
     if last_question:
-        q_lower = last_question.lower()
+        words = set(_WORD_RE.findall(last_question.lower()))
         story_options = []
 
-        if any(w in q_lower for w in ["revenue", "sales", "income", "profit"]):
+        if not _KW_REVENUE.isdisjoint(words):
             story_options.extend([
                 "How does this compare to last month?",
                 "Show the revenue trend over the last 6 months",
                 "Break this down by product category"
             ])
 
-        if any(w in q_lower for w in ["customer", "user", "client"]):
+        if not _KW_CUSTOMER.isdisjoint(words):
             story_options.extend([
                 "Show the top 5 most active customers",
                 "What is the average lifetime value?",
                 "Show distribution of customers by region"
             ])
 
-        if any(w in q_lower for w in ["product", "item", "stock", "inventory"]):
+        if not _KW_PRODUCT.isdisjoint(words):
             story_options.extend([
                 "Which products have high stock but low sales?",
                 "Show sales performance for this category",
                 "What is the return rate for these items?"
             ])
 
-        if any(w in q_lower for w in ["order", "transaction"]):
+        if not _KW_ORDER.isdisjoint(words):
             story_options.extend([
                 "What is the average order processing time?",
                 "Show orders with delayed status"
@@ -191,17 +418,13 @@ def generate_insights(schema: Dict[str, Any], role: str, last_question: Optional
 
         insights.extend(story_options)
 
-    # De-duplicate and Shuffle
-    insights = list(set(insights))
-    random.shuffle(insights)
+    # De-duplicate; shuffling and limiting happen in generate_insights
+    return tuple(dict.fromkeys(insights))
 
-    # Return limited set, prioritize story items if present (already shuffled though)
-    return insights[:4] if insights else ["How many records are in the database?"]
 
-
-def normalize_query_data(data: Any) -> Optional[List[Dict]]:
+def normalize_query_data(data: Any) -> Optional["pd.DataFrame"]:
     """
-    Normalize query result data to a list of dicts format.
+    Normalize query result data to a DataFrame.
 
     Backend may return:
     - {"columns": [...], "rows": [[...], ...]} format
@@ -211,27 +434,160 @@ def normalize_query_data(data: Any) -> Optional[List[Dict]]:
         data: Raw data from backend
 
     Returns:
-        List of dicts suitable for DataFrame, or None if invalid
+        DataFrame built directly from the rows, or None if invalid
     """
     if not data:
         return None
 
-    # If already a list of dicts, return as-is
-    if isinstance(data, list) and len(data) > 0:
-        if isinstance(data[0], dict):
-            return data
-        # If list of lists, it might be raw rows - can't process without columns
+    pd = _get_pd()
+
+    try:
+        # List of dicts: let pandas build the frame from the records
+        if isinstance(data, list) and len(data) > 0:
+            if isinstance(data[0], dict):
+                return pd.DataFrame.from_records(data)
+            # If list of lists, it might be raw rows - can't process without columns
+            return None
+
+        # Handle {"columns": [...], "rows": [...]} format
+        if isinstance(data, dict):
+            columns = data.get("columns")
+            rows = data.get("rows")
+            if columns and rows and isinstance(columns, list) and isinstance(rows, list):
+                # Build the frame straight from the row lists (no per-row dicts)
+                return pd.DataFrame(rows, columns=columns)
+    except (ValueError, TypeError):
+        # Malformed rows (e.g. longer than the column list) can't be tabulated
         return None
 
-    # Handle {"columns": [...], "rows": [...]} format
+    return None
+
+
+# Currency symbols, thousands separators and whitespace stripped before coercion
+_CURRENCY_RE = re.compile(r'[₹$,\s]')
+_DIGIT_RE = re.compile(r'\d')
+
+
+@st.cache_data(show_spinner=False, max_entries=200)
+def prepare_table(msg_id: str, _data: Any) -> Optional[Any]:
+    """
+    Coerced result table for an assistant message, cached by message id.
+
+    A message's data never changes once stored, so the id alone is the cache
+    key and history reruns skip serializing and hashing the data.
+    """
+    return _build_table(_data)
+
+
+def _build_table(data: Any) -> Optional[Any]:
+    """Arrow table for result data; the pandas coercion pass runs only if some text cell has a digit."""
+    if not _may_need_coercion(data):
+        table = _arrow_from_raw(data)
+        if table is not None:
+            return table
+    return _to_arrow(_coerce_numeric_frame(data))
+
+
+def _may_need_coercion(data: Any) -> bool:
+    """Whether any row contains a text cell with a digit (e.g. "100", "₹1,000")."""
     if isinstance(data, dict):
+        rows = data.get("rows")
+        rows = rows if isinstance(rows, list) else []
+    elif isinstance(data, list):
+        rows = data
+    else:
+        return True
+
+    # Every row is checked: leading nulls or labels must not hide numeric text further down
+    for row in rows:
+        if isinstance(row, dict):
+            row = row.values()
+        elif not isinstance(row, (list, tuple)):
+            continue
+        if any(isinstance(value, str) and _DIGIT_RE.search(value) for value in row):
+            return True
+    return False
+
+
+def _arrow_from_raw(data: Any) -> Optional[Any]:
+    """Build an Arrow table straight from the backend rows, or None to use the pandas path."""
+    import pyarrow as pa
+
+    if isinstance(data, list) and data and isinstance(data[0], dict):
+        columns = list(dict.fromkeys(key for record in data for key in record))
+        column_values = [[record.get(col) for record in data] for col in columns]
+    elif isinstance(data, dict):
         columns = data.get("columns")
         rows = data.get("rows")
-        if columns and rows and isinstance(columns, list) and isinstance(rows, list):
-            # Convert to list of dicts
-            return [dict(zip(columns, row)) for row in rows]
+        if not (columns and rows and isinstance(columns, list) and isinstance(rows, list)):
+            return None
+        if any(len(row) != len(columns) for row in rows):
+            return None
+        column_values = [list(values) for values in zip(*rows)]
+    else:
+        return None
 
-    return None
+    try:
+        return pa.Table.from_arrays([pa.array(values) for values in column_values], names=columns)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, OverflowError):
+        # Mixed-type columns or ints beyond int64 (BIGINT UNSIGNED): let
+        # pandas/Streamlit sanitize them
+        return None
+
+
+def _to_arrow(df: Optional["pd.DataFrame"]) -> Optional[Any]:
+    """
+    Convert a result frame to a pyarrow Table.
+
+    st.dataframe converts DataFrames to Arrow on every call; caching the Arrow
+    table skips that on reruns. Mixed-type columns Arrow can't type stay a
+    DataFrame, which st.dataframe knows how to sanitize.
+    """
+    if df is None:
+        return None
+    import pyarrow as pa
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return df
+
+
+def _coerce_numeric_frame(data: Any) -> Optional["pd.DataFrame"]:
+    """Normalize data to a DataFrame; backend might return numbers as strings (e.g., "100", "₹1,000")."""
+    df = normalize_query_data(data)
+    if df is None:
+        return None
+
+    pd = _get_pd()
+    for col in df.select_dtypes(include=["object", "string"]).columns:
+        try:
+            # String dtype keeps nulls missing instead of turning them into
+            # "None"/"nan" text; columns that are already strings aren't copied
+            series = df[col]
+            text = series if isinstance(series.dtype, pd.StringDtype) else series.astype("string")
+            # Coercion can't reach the 40% bar below unless that many cells
+            # contain a digit, so leave pure-text columns alone.
+            if text.str.contains(_DIGIT_RE).mean() < 0.4:
+                continue
+
+            coerced = pd.to_numeric(text.str.replace(_CURRENCY_RE, '', regex=True), errors='coerce')
+
+            # LOGIC: If a significant portion (>40%) of the column converts to numbers,
+            # assume it's a numeric column and use the coerced values.
+            # This handles mixed columns (e.g. ["100", "N/A"]) while preserving
+            # text columns (e.g. ["Widget A"]) which would become all NaNs.
+            if coerced.notna().mean() > 0.4:
+                df[col] = coerced
+        except Exception:
+            # Keep as original if conversion fails
+            pass
+
+    # Narrow integer columns to shrink the Arrow payload st.dataframe ships to
+    # the browser. Floats stay float64: float32 would alter displayed values.
+    for col in df.select_dtypes(include=["int64", "Int64"]).columns:
+        df[col] = pd.to_numeric(df[col], downcast="integer")
+
+    return df
 
 
 # Page Configuration
@@ -317,17 +673,34 @@ st.markdown("""
 # ============================================================================
 
 
+def _loads_json(payload: Any) -> Any:
+    """
+    Parse JSON with orjson, falling back to stdlib json.
+
+    The backend serializes with stdlib json, which can emit NaN/Infinity
+    literals that orjson rejects. Raises ValueError on invalid JSON.
+    """
+    try:
+        return orjson.loads(payload)
+    except orjson.JSONDecodeError:
+        return json.loads(payload)
+
+
+@st.cache_data(ttl=10, show_spinner=False)
 def check_api_health() -> Dict[str, Any]:
     """
     Check if the backend API is healthy.
 
+    Cached for 10s so sidebar reruns don't block on a /health round-trip;
+    call check_api_health.clear() to force a fresh probe.
+
     Returns:
         Dict with 'status', 'database_connected', 'agent_ready' keys
     """
     try:
-        response = requests.get(f"{API_BASE_URL}/health", timeout=5)
+        response = get_session().get(f"{API_BASE_URL}/health", timeout=5)
         if response.status_code == 200:
-            return response.json()
+            return _loads_json(response.content)
         return {"status": "error", "error": response.text}
     except Exception as e:
         return {"status": "error", "error": str(e)}
@@ -337,29 +710,54 @@ def get_database_schema(token: Optional[str] = None) -> Optional[Dict[str, Any]]
     """
     Fetch database schema from the API.
 
+    Successful responses are cached for 5 minutes per token; failures are
+    not cached so the next attempt retries.
+
     Args:
         token: Optional JWT token for authentication
 
     Returns:
         Schema dict or None if fetch fails
     """
-    headers = {}
-    if token:
-        headers["Authorization"] = f"Bearer {token}"
-
     try:
-        response = requests.get(
-            f"{API_BASE_URL}/schema",
-            headers=headers,
-            timeout=30
-        )
-        if response.status_code == 200:
-            return response.json()
-        return None
+        return _fetch_database_schema(token)
     except Exception:
         return None
 
 
+@st.cache_data(ttl=300, show_spinner=False)
+def _fetch_database_schema(token: Optional[str]) -> Dict[str, Any]:
+    headers = {"Accept-Encoding": "gzip"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+
+    response = get_session().get(
+        f"{API_BASE_URL}/schema",
+        headers=headers,
+        timeout=30
+    )
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+
+def _warm_up_backend(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Fetch the schema while /health is probed concurrently on a worker thread.
+
+    Both go through their st.cache_data wrappers, so the rerun after
+    auto-login reads the health status from cache instead of waiting on a
+    second sequential round-trip.
+    """
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pool.submit(check_api_health)
+        return get_database_schema(token)
+
+
+# (connect, read) timeouts for the SSE request; the read timeout applies per
+# socket read, and backend heartbeats keep it from firing while the agent works
+_STREAM_TIMEOUT = (5, 30)
+
+
 def query_backend_stream(question: str, token: Optional[str] = None) -> Generator[Dict, None, None]:
     """
     Stream query results from the backend via SSE.
@@ -373,35 +771,76 @@ def query_backend_stream(question: str, token: Optional[str] = None) -> Generato
     """
     headers = {
         "Content-Type": "application/json",
-        "Accept": "text/event-stream"
+        "Accept": "text/event-stream",
+        # Keep SSE uncompressed so events aren't held back in gzip buffers
+        "Accept-Encoding": "identity"
     }
     if token:
         headers["Authorization"] = f"Bearer {token}"
 
     try:
-        response = requests.post(
+        response = get_session().post(
             f"{API_BASE_URL}/query/stream",
             json={"question": question},
             headers=headers,
             stream=True,
-            timeout=300
+            timeout=_STREAM_TIMEOUT
         )
         response.raise_for_status()
 
-        for line in response.iter_lines():
-            if line:
-                line_str = line.decode("utf-8")
-                if line_str.startswith("data: "):
-                    event_data = line_str[6:]  # Remove 'data: ' prefix
-                    try:
-                        yield json.loads(event_data)
-                    except json.JSONDecodeError:
-                        continue
+        try:
+            yield from _iter_sse_events(response.iter_content(chunk_size=8192))
+        except requests.exceptions.RequestException as e:
+            # The backend sends heartbeats every 15s, so a read timeout
+            # means the stream is dead rather than the agent being slow
+            if _is_read_timeout(e):
+                yield {"type": "error", "error": f"stream stalled: no data for {_STREAM_TIMEOUT[1]}s"}
+                return
+            raise
 
     except Exception as e:
         yield {"type": "error", "error": str(e)}
 
 
+def _is_read_timeout(exc: Exception) -> bool:
+    # requests wraps mid-body read timeouts in a ConnectionError
+    return isinstance(exc, requests.exceptions.ReadTimeout) or any(
+        isinstance(arg, ReadTimeoutError) for arg in exc.args
+    )
+
+
+def _iter_sse_events(chunks: Iterable[bytes]) -> Generator[Dict, None, None]:
+    """
+    Yield the JSON payloads of the SSE events in a stream of raw byte chunks.
+
+    Events are split on blank lines at the byte level; only the data payloads
+    are ever decoded (orjson parses bytes directly).
+    """
+    buf = bytearray()
+    for chunk in chunks:
+        if not chunk:
+            continue
+        buf.extend(chunk)
+        while (idx := buf.find(b"\n\n")) != -1:
+            event = bytes(buf[:idx])
+            del buf[:idx + 2]
+            yield from _parse_sse_event(event)
+
+    # A final event without the trailing blank line
+    if buf.strip():
+        yield from _parse_sse_event(bytes(buf))
+
+
+def _parse_sse_event(event: bytes) -> Generator[Dict, None, None]:
+    """Yield the JSON payload of each 'data: ' line in a raw SSE event."""
+    for line in event.split(b"\n"):
+        if line.startswith(b"data: "):
+            try:
+                yield _loads_json(line[6:])  # Remove 'data: ' prefix
+            except ValueError:
+                continue
+
+
 def query_backend_once(question: str, token: Optional[str] = None) -> Dict[str, Any]:
     """
     Non-streaming query fallback to the backend /query endpoint.
@@ -409,11 +848,11 @@ def query_backend_once(question: str, token: Optional[str] = None) -> Dict[str,
     Returns:
         Dict with keys: answer, data, execution_time, reasoning_steps, error (optional)
     """
-    headers = {"Content-Type": "application/json"}
+    headers = {"Content-Type": "application/json", "Accept-Encoding": "gzip"}
     if token:
         headers["Authorization"] = f"Bearer {token}"
 
-    response = requests.post(
+    response = get_session().post(
         f"{API_BASE_URL}/query",
         json={"question": question},
         headers=headers,
@@ -421,7 +860,7 @@ def query_backend_once(question: str, token: Optional[str] = None) -> Dict[str,
     )
     if response.status_code != 200:
         return {"answer": "", "data": None, "execution_time": 0, "reasoning_steps": 0, "error": response.text}
-    return response.json()
+    return orjson.loads(response.content)
 
 
 # ============================================================================
@@ -429,20 +868,20 @@ def query_backend_once(question: str, token: Optional[str] = None) -> Dict[str,
 # ============================================================================
 
 
-def render_data_table(df: pd.DataFrame) -> None:
-    """Render only the raw data table (no chart)."""
-    if df.empty:
+def render_data_table(table: Any) -> None:
+    """Render only the raw data table (no chart) from an Arrow table or DataFrame."""
+    if len(table) == 0:
         st.info("No data to display.")
         return
 
     try:
         with st.expander("📋 View Raw Data", expanded=True):
-            st.dataframe(df, use_container_width=True)
-            st.caption(f"{len(df)} rows")
+            st.dataframe(table, use_container_width=True)
+            st.caption(f"{len(table)} rows")
 
     except Exception as e:
         st.warning(f"Could not render table: {e}")
-        st.dataframe(df, use_container_width=True)
+        st.dataframe(table, use_container_width=True)
 
 
 # ============================================================================
@@ -450,7 +889,13 @@ def render_data_table(df: pd.DataFrame) -> None:
 # ============================================================================
 
 
-def render_response(answer: str, data: Any, metadata: Dict, pii: Optional[Dict[str, Any]] = None) -> None:
+def render_response(
+    answer: str,
+    data: Any,
+    metadata: Dict,
+    pii: Optional[Dict[str, Any]],
+    msg_id: str
+) -> None:
     """
     Render the assistant's response with optional table/chart.
 
@@ -458,6 +903,7 @@ def render_response(answer: str, data: Any, metadata: Dict, pii: Optional[Dict[s
         answer: Natural language answer text
         data: Query result data (may be columns/rows format or list of dicts)
         metadata: Execution metadata (time, steps)
+        msg_id: Assistant message id, used as the table cache key
     """
     # Display the answer
     st.markdown(answer)
@@ -472,46 +918,23 @@ def render_response(answer: str, data: Any, metadata: Dict, pii: Optional[Dict[s
         else:
             st.caption("No PII entities detected in the question.")
 
+    # Result data of older messages is dropped when history is persisted
+    if isinstance(data, dict) and data.get("__truncated__"):
+        st.caption(f"Data trimmed from history ({data.get('row_count', 0)} rows)")
+        data = None
+
     # Normalize and render table if present
-    normalized_data = normalize_query_data(data)
-    if normalized_data and len(normalized_data) > 0:
+    if data:
         try:
-            df = pd.DataFrame(normalized_data)
-
-            # Smart Type Coercion for Charting
-            # Backend might return numbers as strings (e.g., "100", "₹1,000")
-            for col in df.columns:
-                try:
-                    # Clean potential currency/formatting if string type
-                    if df[col].dtype == 'object':
-                        # Remove currency symbols (₹, $), commas, and whitespace
-                        cleaned_col = df[col].astype(str).str.replace(
-                            r'[₹$,\s]', '', regex=True)
-
-                        # Attempt to convert to numeric with coercion (turning errors to NaN)
-                        coerced = pd.to_numeric(cleaned_col, errors='coerce')
-
-                        # LOGIC: If a significant portion (>40%) of the column converts to numbers,
-                        # assume it's a numeric column and use the coerced values.
-                        # This handles mixed columns (e.g. ["100", "N/A"]) while preserving
-                        # text columns (e.g. ["Widget A"]) which would become all NaNs.
-                        if coerced.notna().mean() > 0.4:
-                            df[col] = coerced
-                        # Else: Keep original object type
-                    else:
-                        # Already numeric or other type
-                        df[col] = pd.to_numeric(df[col], errors='ignore')
-                except Exception:
-                    # Keep as original if conversion fails
-                    pass
-
-            render_data_table(df)
-
+            # Smart Type Coercion (cached per message)
+            table = prepare_table(msg_id, data)
         except Exception as e:
             st.warning(f"Could not process visualization: {e}")
-            # Fallback to simple table
-            st.dataframe(pd.DataFrame(normalized_data),
-                         use_container_width=True)
+            # Fallback to the uncoerced table
+            table = normalize_query_data(data)
+
+        if table is not None and len(table) > 0:
+            render_data_table(table)
 
     # Display metadata
     if metadata:
@@ -531,6 +954,13 @@ def render_response(answer: str, data: Any, metadata: Dict, pii: Optional[Dict[s
 # ============================================================================
 
 
+def _badge(ok: bool, ok_label: str, bad_label: str, bad_color: str = "red", bad_note: str = "") -> str:
+    """Colored status span for the sidebar API status block."""
+    if ok:
+        return f'<span style="color:green; margin-left:5px;"><b>{ok_label}</b></span>'
+    return f'<span style="color:{bad_color}; margin-left:5px;"><b>{bad_label}</b>{bad_note}</span>'
+
+
 def render_sidebar() -> None:
     """Render the sidebar with auth, status, schema, and controls."""
 
@@ -568,7 +998,7 @@ def render_sidebar() -> None:
                 st.session_state.jwt_token = token
                 st.session_state.user_role = "admin"
                 with st.spinner("Loading schema..."):
-                    schema = get_database_schema(token)
+                    schema = _warm_up_backend(token)
                     if schema:
                         st.session_state.schema = schema
                         st.session_state.insights = generate_insights(schema, "admin")
@@ -582,7 +1012,7 @@ def render_sidebar() -> None:
             new_chat = _new_chat(f"Chat {len(st.session_state.chats) + 1}")
             st.session_state.chats.append(new_chat)
             st.session_state.active_chat_id = new_chat["id"]
-            save_history(st.session_state.chats)
+            save_chat_index(st.session_state.chats)
             st.rerun()
 
         if st.session_state.chats:
@@ -599,31 +1029,20 @@ def render_sidebar() -> None:
 
         # API Status - Granular
         st.markdown("**API Status**")
+        if st.button("🔄 Refresh Status", use_container_width=True):
+            check_api_health.clear()
         health = check_api_health()
 
-        # Database Status
-        if health.get("database_connected"):
-            st.markdown(
-                '<div class="status-item">🗄️ Database: <span style="color:green; margin-left:5px;"><b>Connected</b></span></div>', unsafe_allow_html=True)
-        else:
-            st.markdown(
-                '<div class="status-item">🗄️ Database: <span style="color:red; margin-left:5px;"><b>Disconnected</b></span></div>', unsafe_allow_html=True)
-
-        # Agent Status
-        if health.get("agent_ready"):
-            st.markdown(
-                '<div class="status-item">🤖 Agent: <span style="color:green; margin-left:5px;"><b>Ready</b></span></div>', unsafe_allow_html=True)
-        else:
-            st.markdown(
-                '<div class="status-item">🤖 Agent: <span style="color:red; margin-left:5px;"><b>Not Ready</b></span></div>', unsafe_allow_html=True)
-
-        # Redis Status
-        if health.get("redis_connected"):
-            st.markdown(
-                '<div class="status-item">📦 Redis: <span style="color:green; margin-left:5px;"><b>Connected</b></span></div>', unsafe_allow_html=True)
-        else:
-            st.markdown(
-                '<div class="status-item">📦 Redis: <span style="color:orange; margin-left:5px;"><b>Disconnected</b> (Stateless)</span></div>', unsafe_allow_html=True)
+        # Database / Agent / Redis status in a single element
+        status_html = (
+            f'<div class="status-item">🗄️ Database: '
+            f'{_badge(health.get("database_connected"), "Connected", "Disconnected")}</div>'
+            f'<div class="status-item">🤖 Agent: '
+            f'{_badge(health.get("agent_ready"), "Ready", "Not Ready")}</div>'
+            f'<div class="status-item">📦 Redis: '
+            f'{_badge(health.get("redis_connected"), "Connected", "Disconnected", "orange", " (Stateless)")}</div>'
+        )
+        st.markdown(status_html, unsafe_allow_html=True)
 
         if health.get("status") != "healthy" and "error" in health:
             st.caption(f"Error: {health.get('error')}")
@@ -635,6 +1054,8 @@ def render_sidebar() -> None:
         if st.session_state.jwt_token:
             if st.button("📊 Load Schema", use_container_width=True):
                 with st.spinner("Loading..."):
+                    # An explicit reload refetches instead of reusing the cached schema
+                    _fetch_database_schema.clear()
                     schema = get_database_schema(st.session_state.jwt_token)
                     if schema:
                         st.session_state.schema = schema
@@ -665,7 +1086,7 @@ def render_sidebar() -> None:
                 st.session_state.chats = [new_chat]
                 st.session_state.active_chat_id = new_chat["id"]
             st.session_state.debug_events = []
-            save_history(st.session_state.chats)
+            delete_chat(active_id, st.session_state.chats)
             st.rerun()
 
 
@@ -674,6 +1095,203 @@ def render_sidebar() -> None:
 # ============================================================================
 
 
+def _render_history(messages: List[Dict[str, Any]]) -> None:
+    """Render the chat history."""
+    for message in messages:
+        with st.chat_message(message["role"]):
+            if message["role"] == "assistant":
+                # Backfill ids for messages persisted before ids existed
+                msg_id = message.setdefault("id", uuid.uuid4().hex)
+                render_response(
+                    message.get("content", ""),
+                    message.get("data"),
+                    message.get("metadata", {}),
+                    message.get("pii"),
+                    msg_id
+                )
+            else:
+                st.markdown(message["content"])
+
+
+# Streamed answer redraw cadence: at most every 50ms, or sooner once 64 new chars arrive
+_STREAM_FLUSH_SECONDS = 0.05
+_STREAM_FLUSH_CHARS = 64
+
+
+def _process_pending_message(active_chat: Optional[Dict[str, Any]], active_messages: List[Dict[str, Any]]) -> None:
+    """Stream the backend answer for the last (unhandled) user message, then rerun the app."""
+    user_question = active_messages[-1]["content"]
+
+    # Check if authenticated
+    if not st.session_state.jwt_token:
+        with st.chat_message("assistant"):
+            st.warning(
+                "⚠️ Please login first using the sidebar to ask questions.")
+        login_message = {
+            "id": uuid.uuid4().hex,
+            "role": "assistant",
+            "content": "Please login first using the sidebar to ask questions.",
+            "data": None,
+            "metadata": {}
+        }
+        active_messages.append(login_message)
+        if active_chat:
+            append_message(active_chat["id"], login_message)
+        active_messages[-2]["handled"] = True
+        st.rerun()
+
+    # Set processing flag
+    st.session_state.is_processing = True
+    assistant_msg_id = uuid.uuid4().hex
+
+    with st.chat_message("assistant"):
+        # Thinking indicator
+        thinking_placeholder = st.empty()
+        thinking_placeholder.markdown("*Thinking...*")
+
+        # Stream buffer - accumulates events cleanly
+        stream_buffer = {
+            "answer": "",
+            "data": None,
+            "metadata": {},
+            "errors": [],
+            "pii": None
+        }
+        received_any_event = False
+        sql_result_str = None
+        last_flush = time.monotonic()
+        pending_chars = 0
+
+        # Process SSE stream with JWT token
+        for event in query_backend_stream(user_question, st.session_state.jwt_token):
+            received_any_event = True
+            event_type = event.get("type")
+
+            # Log for debugging (invisible to user)
+            st.session_state.debug_events.append(event)
+
+            if event_type == "step_start":
+                step_name = event.get("step_name", "Processing")
+                thinking_placeholder.markdown(f"*{step_name}...*")
+
+            elif event_type == "step_complete":
+                # Capture SQL results from execute_sql_tool
+                tool_name = event.get("tool_name")
+                status = event.get("status")
+                if tool_name == "execute_sql_tool" and status == "success":
+                    # Parsed only if the done event carries no data (see below)
+                    sql_result_str = event.get("tool_result", "{}")
+
+            elif event_type == "answer_chunk":
+                content = event.get("content", "")
+                stream_buffer["answer"] += content
+                pending_chars += len(content)
+                # Progressive display, throttled: each redraw resends the whole answer
+                now = time.monotonic()
+                if now - last_flush >= _STREAM_FLUSH_SECONDS or pending_chars >= _STREAM_FLUSH_CHARS:
+                    thinking_placeholder.markdown(stream_buffer["answer"])
+                    last_flush = now
+                    pending_chars = 0
+
+            elif event_type == "done":
+                stream_buffer["answer"] = event.get(
+                    "answer", stream_buffer["answer"])
+                # Use data from done event if available, otherwise keep the one from step_complete
+                done_data = event.get("data")
+                if done_data:
+                    stream_buffer["data"] = done_data
+                stream_buffer["metadata"] = {
+                    "execution_time": event.get("execution_time", 0),
+                    "reasoning_steps": event.get("reasoning_steps", 0)
+                }
+                if event.get("pii") is not None:
+                    stream_buffer["pii"] = event.get("pii")
+                break
+
+            elif event_type == "error":
+                stream_buffer["errors"].append(
+                    event.get("error", "Unknown error"))
+                break
+
+        # The done event normally carries the (decoded) result data; only fall
+        # back to parsing the raw execute_sql_tool result when it didn't
+        if not stream_buffer["data"] and sql_result_str:
+            try:
+                sql_data = _loads_json(sql_result_str)
+                if sql_data and ("columns" in sql_data or isinstance(sql_data, list)):
+                    stream_buffer["data"] = sql_data
+            except (ValueError, TypeError):
+                pass  # Ignore parse errors
+
+        # If the stream returned nothing, fall back to non-streaming endpoint
+        if not received_any_event and not stream_buffer["errors"]:
+            fallback = query_backend_once(user_question, st.session_state.jwt_token)
+            if fallback.get("error"):
+                stream_buffer["errors"].append(fallback.get("error"))
+            else:
+                stream_buffer["answer"] = fallback.get("answer", "")
+                stream_buffer["data"] = fallback.get("data")
+                stream_buffer["metadata"] = {
+                    "execution_time": fallback.get("execution_time", 0),
+                    "reasoning_steps": fallback.get("reasoning_steps", 0)
+                }
+
+        # Clear thinking indicator
+        thinking_placeholder.empty()
+
+        # Handle errors
+        if stream_buffer["errors"]:
+            error_msg = "I encountered an error processing your request."
+            st.error(error_msg)
+            stream_buffer["answer"] = error_msg
+
+        # Render final response
+        render_response(
+            stream_buffer["answer"] or "No response received.",
+            stream_buffer["data"],
+            stream_buffer["metadata"],
+            stream_buffer["pii"],
+            assistant_msg_id
+        )
+
+    # Save assistant message
+    assistant_message = {
+        "id": assistant_msg_id,
+        "role": "assistant",
+        "content": stream_buffer["answer"] or "No response received.",
+        "data": stream_buffer["data"],
+        "metadata": stream_buffer["metadata"],
+        "pii": stream_buffer["pii"]
+    }
+    active_messages.append(assistant_message)
+
+    # Mark user message as handled
+    active_messages[-2]["handled"] = True
+
+    # Set chat title from first user question
+    if active_chat and active_chat.get("title", "").startswith("Chat"):
+        active_chat["title"] = user_question[:60]
+        save_chat_index(st.session_state.chats)
+
+    # Regenerate insights based on the new context
+    if st.session_state.schema:
+        st.session_state.insights = generate_insights(
+            st.session_state.schema,
+            st.session_state.user_role or "viewer",
+            user_question
+        )
+
+    # Reset processing flag
+    st.session_state.is_processing = False
+
+    # Persist the assistant response
+    if active_chat:
+        append_message(active_chat["id"], assistant_message)
+
+    # Rerun to clean up UI
+    st.rerun()
+
+
 def main():
     """Main application entry point."""
 
@@ -687,6 +1305,7 @@ def main():
         new_chat = _new_chat("Chat 1")
         st.session_state.chats.append(new_chat)
         st.session_state.active_chat_id = new_chat["id"]
+        save_chat_index(st.session_state.chats)
 
     active_chat = get_active_chat()
     active_messages = active_chat["messages"] if active_chat else []
@@ -701,17 +1320,7 @@ def main():
         )
 
     # Display chat history
-    for message in active_messages:
-        with st.chat_message(message["role"]):
-            if message["role"] == "assistant":
-                render_response(
-                    message.get("content", ""),
-                    message.get("data"),
-                    message.get("metadata", {}),
-                    message.get("pii")
-                )
-            else:
-                st.markdown(message["content"])
+    _render_history(active_messages)
 
     # Handle pending user message (needs processing)
     if (
@@ -720,152 +1329,7 @@ def main():
         and not active_messages[-1].get("handled")
         and not st.session_state.is_processing
     ):
-        user_question = active_messages[-1]["content"]
-
-        # Check if authenticated
-        if not st.session_state.jwt_token:
-            with st.chat_message("assistant"):
-                st.warning(
-                    "⚠️ Please login first using the sidebar to ask questions.")
-            active_messages.append({
-                "role": "assistant",
-                "content": "Please login first using the sidebar to ask questions.",
-                "data": None,
-                "metadata": {}
-            })
-            active_messages[-2]["handled"] = True
-            st.rerun()
-
-        # Set processing flag
-        st.session_state.is_processing = True
-
-        with st.chat_message("assistant"):
-            # Thinking indicator
-            thinking_placeholder = st.empty()
-            thinking_placeholder.markdown("*Thinking...*")
-
-            # Stream buffer - accumulates events cleanly
-            stream_buffer = {
-                "answer": "",
-                "data": None,
-                "metadata": {},
-                "errors": [],
-                "pii": None
-            }
-            received_any_event = False
-
-            # Process SSE stream with JWT token
-            for event in query_backend_stream(user_question, st.session_state.jwt_token):
-                received_any_event = True
-                event_type = event.get("type")
-
-                # Log for debugging (invisible to user)
-                st.session_state.debug_events.append(event)
-
-                if event_type == "step_start":
-                    step_name = event.get("step_name", "Processing")
-                    thinking_placeholder.markdown(f"*{step_name}...*")
-
-                elif event_type == "step_complete":
-                    # Capture SQL results from execute_sql_tool
-                    tool_name = event.get("tool_name")
-                    status = event.get("status")
-                    if tool_name == "execute_sql_tool" and status == "success":
-                        try:
-                            tool_result_str = event.get("tool_result", "{}")
-                            sql_data = json.loads(tool_result_str)
-                            if sql_data and ("columns" in sql_data or isinstance(sql_data, list)):
-                                stream_buffer["data"] = sql_data
-                        except (json.JSONDecodeError, TypeError):
-                            pass  # Ignore parse errors
-
-                elif event_type == "answer_chunk":
-                    stream_buffer["answer"] += event.get("content", "")
-                    # Progressive display
-                    thinking_placeholder.markdown(stream_buffer["answer"])
-
-                elif event_type == "done":
-                    stream_buffer["answer"] = event.get(
-                        "answer", stream_buffer["answer"])
-                    # Use data from done event if available, otherwise keep the one from step_complete
-                    done_data = event.get("data")
-                    if done_data:
-                        stream_buffer["data"] = done_data
-                    stream_buffer["metadata"] = {
-                        "execution_time": event.get("execution_time", 0),
-                        "reasoning_steps": event.get("reasoning_steps", 0)
-                    }
-                    if event.get("pii") is not None:
-                        stream_buffer["pii"] = event.get("pii")
-                    break
-
-                elif event_type == "error":
-                    stream_buffer["errors"].append(
-                        event.get("error", "Unknown error"))
-                    break
-
-            # If the stream returned nothing, fall back to non-streaming endpoint
-            if not received_any_event and not stream_buffer["errors"]:
-                fallback = query_backend_once(user_question, st.session_state.jwt_token)
-                if fallback.get("error"):
-                    stream_buffer["errors"].append(fallback.get("error"))
-                else:
-                    stream_buffer["answer"] = fallback.get("answer", "")
-                    stream_buffer["data"] = fallback.get("data")
-                    stream_buffer["metadata"] = {
-                        "execution_time": fallback.get("execution_time", 0),
-                        "reasoning_steps": fallback.get("reasoning_steps", 0)
-                    }
-
-            # Clear thinking indicator
-            thinking_placeholder.empty()
-
-            # Handle errors
-            if stream_buffer["errors"]:
-                error_msg = "I encountered an error processing your request."
-                st.error(error_msg)
-                stream_buffer["answer"] = error_msg
-
-            # Render final response
-            render_response(
-                stream_buffer["answer"] or "No response received.",
-                stream_buffer["data"],
-                stream_buffer["metadata"],
-                stream_buffer["pii"]
-            )
-
-        # Save assistant message
-        active_messages.append({
-            "role": "assistant",
-            "content": stream_buffer["answer"] or "No response received.",
-            "data": stream_buffer["data"],
-            "metadata": stream_buffer["metadata"],
-            "pii": stream_buffer["pii"]
-        })
-
-        # Mark user message as handled
-        active_messages[-2]["handled"] = True
-
-        # Set chat title from first user question
-        if active_chat and active_chat.get("title", "").startswith("Chat"):
-            active_chat["title"] = user_question[:60]
-
-        # Regenerate insights based on the new context
-        if st.session_state.schema:
-            st.session_state.insights = generate_insights(
-                st.session_state.schema,
-                st.session_state.user_role or "viewer",
-                user_question
-            )
-
-        # Reset processing flag
-        st.session_state.is_processing = False
-
-        # Persist history after assistant response
-        save_history(st.session_state.chats)
-
-        # Rerun to clean up UI
-        st.rerun()
+        _process_pending_message(active_chat, active_messages)
 
     # Chat input (disabled while processing)
     # Display suggested questions if available
@@ -880,21 +1344,25 @@ def main():
             for i, suggestion in enumerate(suggestions):
                 with cols[i]:
                     if st.button(suggestion, key=f"suggestion_{i}", use_container_width=True):
-                        active_messages.append(
-                            {"role": "user", "content": suggestion, "handled": False})
+                        user_message = {"role": "user", "content": suggestion, "handled": False}
+                        active_messages.append(user_message)
+                        if active_chat:
+                            append_message(active_chat["id"], user_message)
                         st.rerun()
 
     if prompt := st.chat_input(
         "Ask a question about your database...",
         disabled=st.session_state.is_processing
     ):
-        active_messages.append({
+        user_message = {
             "role": "user",
             "content": prompt,
             "ts": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "handled": False
-        })
-        save_history(st.session_state.chats)
+        }
+        active_messages.append(user_message)
+        if active_chat:
+            append_message(active_chat["id"], user_message)
         st.rerun()
 
 
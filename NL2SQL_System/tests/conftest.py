@@ -0,0 +1,15 @@
+"""Shared pytest configuration."""
+import os
+import shutil
+import tempfile
+
+# streamlit_app loads (and may migrate) chat history at import time, so point
+# it at a scratch directory before any test imports it
+_HISTORY_ROOT = tempfile.mkdtemp(prefix="nl2sql_chat_history_")
+os.environ["CHAT_HISTORY_DIR"] = os.path.join(_HISTORY_ROOT, "chat_history")
+os.environ["CHAT_HISTORY_FILE"] = os.path.join(_HISTORY_ROOT, "chat_history.json")
+
+
+def pytest_unconfigure(config):
+    """Remove the scratch chat history directory."""
+    shutil.rmtree(_HISTORY_ROOT, ignore_errors=True)
@@ -0,0 +1,225 @@
+"""Tests for PII masking helpers."""
+import csv
+import os
+
+import pytest
+from unittest.mock import Mock
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+
+
+@pytest.mark.parametrize("value", [
+    "486.880.1128x059",
+    "(502)660-6474x6872",
+    "+1-219-560-0133x42",
+    "001-361-855-9407x123",
+    "call 98765 43210",
+])
+def test_prefilter_keeps_phone_formats(value):
+    """Phone numbers with extensions must still reach Presidio."""
+    from privacy.encoder import _is_pii_candidate_text
+
+    assert _is_pii_candidate_text(value)
+
+
+@pytest.mark.parametrize("value", ["delivered", "2024-05-22 shipped", "net 45"])
+def test_prefilter_skips_plain_values(value):
+    """Lowercase codes and dates are not PII candidates."""
+    from privacy.encoder import _is_pii_candidate_text
+
+    assert not _is_pii_candidate_text(value)
+
+
+def test_prefilter_keeps_dataset_phones():
+    """Every phone in the sample data that has letters passes the prefilter."""
+    from privacy.encoder import _is_pii_candidate_text
+
+    for name in ("customers.csv", "suppliers.csv"):
+        with open(os.path.join(DATA_DIR, name), newline="", encoding="utf-8") as f:
+            phones = [row["phone"] for row in csv.DictReader(f)]
+        assert phones
+        for phone in phones:
+            if any(ch.isalpha() for ch in phone):
+                assert _is_pii_candidate_text(phone), phone
+
+
+def test_analyze_batch_maps_spans_to_cells():
+    """Batched spans are remapped per cell and split across separators."""
+    from privacy.encoder import _BATCH_SEPARATOR, _analyze_batch
+
+    texts = ["Linda", "Wolfe x", "a@b.io"]
+    joined = _BATCH_SEPARATOR.join(texts)
+    second = joined.index("Wolfe")
+    third = joined.index("a@b.io")
+
+    def span(entity_type, start, end):
+        return Mock(entity_type=entity_type, start=start, end=end, score=0.9)
+
+    analyzer = Mock()
+    analyzer.analyze.return_value = [
+        # Inside a single cell
+        span("EMAIL_ADDRESS", third, third + 6),
+        # Across the separator between the first two cells
+        span("PERSON", 0, second + 5),
+        # Wholly inside a separator
+        span("LOCATION", 5, second),
+    ]
+
+    results = _analyze_batch(analyzer, texts)
+
+    assert [(e["entity_type"], e["start"], e["end"]) for e in results[0]] == [("PERSON", 0, 5)]
+    assert [(e["entity_type"], e["start"], e["end"]) for e in results[1]] == [("PERSON", 0, 5)]
+    assert [(e["entity_type"], e["start"], e["end"]) for e in results[2]] == [("EMAIL_ADDRESS", 0, 6)]
+
+
+def test_encrypt_value_round_trip():
+    """AES-GCM values decrypt back to the original string."""
+    from privacy.config import decrypt_value, encrypt_value
+
+    assert decrypt_value(encrypt_value("Linda Wolfe")) == "Linda Wolfe"
+
+
+def test_decrypt_value_accepts_legacy_fernet():
+    """Mappings stored as Fernet tokens still decrypt."""
+    from privacy.config import decrypt_value, fernet
+
+    assert decrypt_value(fernet.encrypt(b"Linda Wolfe").decode()) == "Linda Wolfe"
+
+
+def test_decrypt_value_rejects_tampered_value():
+    """A modified AES-GCM value fails authentication."""
+    import base64
+
+    from privacy.config import decrypt_value, encrypt_value
+
+    raw = bytearray(base64.urlsafe_b64decode(encrypt_value("Linda Wolfe")))
+    raw[-1] ^= 1
+    with pytest.raises(ValueError):
+        decrypt_value(base64.urlsafe_b64encode(bytes(raw)).decode())
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Call 1234 5678 9012 now", [("IN_AADHAAR", "1234 5678 9012")]),
+    ("Ring +91 98765 43210 today", [("PHONE_NUMBER", "+91 98765 43210")]),
+    ("Mail a.b@example.com", [("EMAIL_ADDRESS", "a.b@example.com")]),
+])
+def test_regex_fallback_entities(text, expected):
+    """The fused fallback regex picks the specific entity for each span."""
+    from privacy.encoder import _regex_detect_pii
+
+    found = [(e["entity_type"], text[e["start"]:e["end"]]) for e in _regex_detect_pii(text)]
+    assert found == expected
+
+
+@pytest.fixture
+def pii_decoder(monkeypatch):
+    """privacy.decoder with Redis, the token store and the token file mocked."""
+    from privacy import decoder
+
+    redis_store = {}
+    file_store = {}
+    redis = Mock(is_connected=True)
+    redis.get_pii_mappings.side_effect = lambda tokens: [redis_store.get(t) for t in tokens]
+    redis.get_pii_mapping.side_effect = redis_store.get
+    monkeypatch.setattr(decoder, "redis_client", redis)
+    monkeypatch.setattr(decoder, "_token_store", {})
+    monkeypatch.setattr(decoder, "get_persisted_token", file_store.get)
+    return decoder, redis, redis_store, file_store
+
+
+def test_decode_results_skips_redis_get_after_mget_miss(pii_decoder):
+    """Tokens MGET missed are read from the local file, not re-fetched one by one."""
+    from privacy.config import encrypt_value
+
+    decoder, redis, _, file_store = pii_decoder
+    file_store["[PERSON_AAAAAAAA]"] = encrypt_value("Linda Wolfe")
+
+    decoded = decoder.decode_results({"columns": ["a", "b"], "rows": [["[PERSON_AAAAAAAA]", "[PERSON_BBBBBBBB]"]]})
+
+    assert decoded["rows"] == [["Linda Wolfe", "[PERSON_BBBBBBBB]"]]
+    assert redis.get_pii_mappings.call_count == 1
+    redis.get_pii_mapping.assert_not_called()
+
+
+def test_decode_text_resolves_repeated_tokens_once(pii_decoder, monkeypatch):
+    """A token repeated in one string is looked up and decrypted once."""
+    from privacy.config import decrypt_value, encrypt_value
+
+    decoder, redis, redis_store, _ = pii_decoder
+    redis_store["[PERSON_AAAAAAAA]"] = encrypt_value("Linda")
+    decrypt = Mock(side_effect=decrypt_value)
+    monkeypatch.setattr(decoder, "decrypt_value", decrypt)
+
+    text = "[PERSON_AAAAAAAA] wrote to [PERSON_AAAAAAAA]"
+
+    assert decoder.decode_text(text) == "Linda wrote to Linda"
+    assert decrypt.call_count == 1
+    assert redis.get_pii_mapping.call_count == 1
+
+
+def test_decode_text_keeps_unknown_and_undecryptable_tokens(pii_decoder):
+    """Tokens with no mapping, or whose mapping fails to decrypt, stay in place."""
+    decoder, _, redis_store, _ = pii_decoder
+    redis_store["[EMAIL_ADDRESS_BBBBBBBB]"] = "not-a-ciphertext"
+
+    text = "[PERSON_AAAAAAAA] <[EMAIL_ADDRESS_BBBBBBBB]>"
+
+    assert decoder.decode_text(text) == text
+
+
+@pytest.mark.parametrize("result, expected, decrypts", [
+    (
+        {"columns": ["name", "n"], "rows": [["[PERSON_AAAAAAAA]", 1], ["[PERSON_AAAAAAAA] x", 2]], "row_count": 2},
+        {"columns": ["name", "n"], "rows": [["Linda", 1], ["Linda x", 2]], "row_count": 2},
+        2,
+    ),
+    (
+        [{"name": "[PERSON_AAAAAAAA]", "n": 1}, {"name": "[PERSON_AAAAAAAA]", "n": 2}],
+        [{"name": "Linda", "n": 1}, {"name": "Linda", "n": 2}],
+        1,
+    ),
+    (
+        [["[PERSON_AAAAAAAA]", "[x]"], ["[PERSON_AAAAAAAA]", None]],
+        [["Linda", "[x]"], ["Linda", None]],
+        1,
+    ),
+])
+def test_decode_results_shapes_use_one_mget(pii_decoder, monkeypatch, result, expected, decrypts):
+    """Every result shape is decoded with a single MGET and repeated cells decrypt once."""
+    from privacy.config import decrypt_value, encrypt_value
+
+    decoder, redis, redis_store, _ = pii_decoder
+    redis_store["[PERSON_AAAAAAAA]"] = encrypt_value("Linda")
+    decrypt = Mock(side_effect=decrypt_value)
+    monkeypatch.setattr(decoder, "decrypt_value", decrypt)
+
+    assert decoder.decode_results(result) == expected
+    assert redis.get_pii_mappings.call_count == 1
+    redis.get_pii_mapping.assert_not_called()
+    # Identical cells decode once; "[PERSON_AAAAAAAA] x" is a distinct cell
+    assert decrypt.call_count == decrypts
+
+
+def test_token_file_flush_round_trip(tmp_path, monkeypatch):
+    """Persisted mappings flush atomically to the orjson token file and reload."""
+    from privacy import encoder
+
+    token_file = tmp_path / ".token_store.json"
+    monkeypatch.setattr(encoder, "_TOKEN_FILE", str(token_file))
+    monkeypatch.setattr(encoder, "_TOKEN_CACHE", {})
+    # Keep the debounce timer from firing on its own during the test
+    monkeypatch.setattr(encoder, "_TOKEN_FLUSH_DELAY_SECONDS", 60)
+
+    mappings = {"[PERSON_AAAAAAAA]": "enc-a", "[EMAIL_ADDRESS_BBBBBBBB]": "enc-b"}
+    encoder._persist_tokens(mappings)
+    assert not token_file.exists()
+
+    encoder._flush_token_file()
+
+    assert encoder._load_token_file() == mappings
+    assert not (tmp_path / ".token_store.json.tmp").exists()
+
+    # Nothing pending: a second flush does not rewrite the file
+    token_file.unlink()
+    encoder._flush_token_file()
+    assert not token_file.exists()
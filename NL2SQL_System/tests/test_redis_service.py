@@ -0,0 +1,38 @@
+"""Tests for the Redis service wrapper."""
+from unittest.mock import Mock, patch
+
+
+def _service(client):
+    """Build a RedisService around a mocked client."""
+    from app.services.redis import RedisService
+
+    with patch("app.services.redis.redis.Redis", return_value=client):
+        return RedisService()
+
+
+def test_delete_token_removes_key():
+    """Logout deletes the session key."""
+    client = Mock()
+    service = _service(client)
+
+    assert service.delete_token("abc") is True
+    client.delete.assert_called_once_with("token:abc")
+
+
+def test_delete_token_handles_errors():
+    """Redis errors are reported as a failed delete."""
+    client = Mock()
+    client.delete.side_effect = ConnectionError("down")
+    service = _service(client)
+
+    assert service.delete_token("abc") is False
+
+
+def test_delete_token_without_client():
+    """Nothing is deleted when Redis is unavailable."""
+    client = Mock()
+    client.ping.side_effect = ConnectionError("down")
+    service = _service(client)
+
+    assert service.delete_token("abc") is False
+    client.delete.assert_not_called()
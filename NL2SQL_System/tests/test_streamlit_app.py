@@ -0,0 +1,205 @@
+"""Tests for the Streamlit frontend helpers."""
+import pytest
+from unittest.mock import Mock
+
+
+@pytest.fixture(scope="module")
+def app():
+    """Import the Streamlit app module (runs in Streamlit's bare mode)."""
+    import streamlit_app
+    return streamlit_app
+
+
+def test_normalize_query_data_rejects_ragged_rows(app):
+    """Rows longer than the column list are not tabulated instead of raising."""
+    data = {"columns": ["name"], "rows": [["Linda", "Wolfe"]]}
+
+    assert app.normalize_query_data(data) is None
+    assert app._build_table(data) is None
+
+
+def test_normalize_query_data_builds_frame(app):
+    """Columns/rows payloads become a DataFrame."""
+    df = app.normalize_query_data({"columns": ["id", "name"], "rows": [[1, "a"], [2, "b"]]})
+
+    assert list(df.columns) == ["id", "name"]
+    assert len(df) == 2
+
+
+def test_build_table_coerces_numeric_text_after_leading_nulls(app):
+    """Numeric text is coerced even when the first rows are all null."""
+    import pyarrow as pa
+
+    table = app._build_table({"columns": ["x"], "rows": [[None]] * 25 + [["100"]] * 30})
+
+    assert pa.types.is_integer(table.schema.field("x").type) or pa.types.is_floating(table.schema.field("x").type)
+
+
+def test_build_table_handles_ints_beyond_int64(app):
+    """BIGINT UNSIGNED values fall back to the pandas path instead of raising."""
+    table = app._build_table({"columns": ["big"], "rows": [[2**63 + 5]]})
+
+    assert table.column("big").to_pylist() == [2**63 + 5]
+
+
+def test_generate_insights_reshuffles_cached_candidates(app, monkeypatch):
+    """The candidate list is cached, but every call draws a fresh shuffle."""
+    schema = {"tables": [
+        {"name": "orders", "columns": [{"name": "id"}]},
+        {"name": "customers", "columns": [{"name": "id"}]},
+        {"name": "products", "columns": [{"name": "price"}, {"name": "cost"}]},
+    ]}
+    shuffle = Mock()
+    monkeypatch.setattr(app.random, "shuffle", shuffle)
+
+    first = app.generate_insights(schema, "admin", "show revenue by customer")
+    second = app.generate_insights(schema, "admin", "show revenue by customer")
+
+    assert shuffle.call_count == 2
+    assert first == second and len(first) == 4
+    # The cached worker keeps every de-duplicated candidate, not just four
+    tables_key = (("orders", ("id",)), ("customers", ("id",)), ("products", ("price", "cost")))
+    candidates = app._generate_insights_cached(tables_key, "admin", "show revenue by customer")
+    assert len(candidates) > 4
+    assert len(set(candidates)) == len(candidates)
+
+
+def test_iter_sse_events_joins_split_chunks(app):
+    """Events split across chunks, pings and a trailing event are handled."""
+    chunks = [
+        b'data: {"type": "to',
+        b'ken", "content": "Hi"}\n',
+        b"\n: ping\n\n",
+        b"",
+        b'data: {"type": "done"}',
+    ]
+
+    assert list(app._iter_sse_events(chunks)) == [
+        {"type": "token", "content": "Hi"},
+        {"type": "done"},
+    ]
+
+
+def test_parse_sse_event_skips_bad_json(app):
+    """Malformed data lines and comments are skipped, valid ones kept."""
+    event = b': ping\ndata: {not json}\ndata: {"type": "done"}'
+
+    assert list(app._parse_sse_event(event)) == [{"type": "done"}]
+
+
+def test_query_backend_stream_reports_stall(app, monkeypatch):
+    """A read timeout mid-stream becomes a 'stream stalled' error event."""
+    import requests
+
+    def chunks(chunk_size):
+        yield b'data: {"type": "status"}\n\n'
+        raise requests.exceptions.ReadTimeout("read timed out")
+
+    response = Mock()
+    response.iter_content.side_effect = chunks
+    session = Mock()
+    session.post.return_value = response
+    monkeypatch.setattr(app, "get_session", lambda: session)
+
+    events = list(app.query_backend_stream("How many orders?"))
+
+    assert events[0] == {"type": "status"}
+    assert events[1]["type"] == "error"
+    assert events[1]["error"].startswith("stream stalled")
+
+
+@pytest.fixture
+def history(app, tmp_path, monkeypatch):
+    """Point chat history persistence at a temporary directory."""
+    history_dir = tmp_path / "chat_history"
+    monkeypatch.setattr(app, "HISTORY_DIR", str(history_dir))
+    monkeypatch.setattr(app, "HISTORY_INDEX", str(history_dir / "index.json"))
+    monkeypatch.setattr(app, "HISTORY_FILE", str(tmp_path / "chat_history.json"))
+    return tmp_path
+
+
+def _result_message(n):
+    return {"role": "assistant", "content": f"answer {n}", "data": {"columns": ["n"], "rows": [[n], [n]], "row_count": 2}}
+
+
+def test_load_history_migrates_legacy_file(app, history):
+    """The old single-file store is split into an index and per-chat files."""
+    import json
+    import os
+
+    messages = [_result_message(n) for n in range(app.HISTORY_FULL_DATA_MESSAGES + 2)]
+    (history / "chat_history.json").write_text(json.dumps(messages))
+
+    chats = app.load_history()["chats"]
+
+    assert len(chats) == 1
+    assert chats[0]["title"] == "Chat 1"
+    assert len(chats[0]["messages"]) == len(messages)
+    assert os.path.exists(app.HISTORY_INDEX)
+
+    # Later loads read the migrated store, not the legacy file
+    os.remove(app.HISTORY_FILE)
+    reloaded = app.load_history()["chats"]
+    assert [c["id"] for c in reloaded] == [chats[0]["id"]]
+    assert reloaded[0]["messages"] == chats[0]["messages"]
+
+
+def test_load_history_backfills_handled(app, history):
+    """User messages followed by a reply are marked handled on load."""
+    chat = app._new_chat("Chat 1")
+    app.save_chat_index([chat])
+    app.append_message(chat["id"], {"role": "user", "content": "q1", "handled": False})
+    app.append_message(chat["id"], {"role": "assistant", "content": "a1"})
+    app.append_message(chat["id"], {"role": "user", "content": "q2", "handled": False})
+
+    messages = app.load_history()["chats"][0]["messages"]
+
+    assert [m.get("handled") for m in messages] == [True, None, False]
+
+
+def test_load_history_trims_old_result_data(app, history):
+    """Only the most recent messages keep their rows, on load and on disk."""
+    chat = app._new_chat("Chat 1")
+    app.save_chat_index([chat])
+    total = app.HISTORY_FULL_DATA_MESSAGES + 2
+    for n in range(total):
+        app.append_message(chat["id"], _result_message(n))
+
+    messages = app.load_history()["chats"][0]["messages"]
+
+    assert [m["data"] for m in messages[:2]] == [{"__truncated__": True, "row_count": 2}] * 2
+    assert all("rows" in m["data"] for m in messages[2:])
+    # The chat file was compacted too
+    assert list(app._iter_messages(chat["id"])) == messages
+
+
+def test_load_history_keeps_index_on_unreadable_chat(app, history):
+    """An unreadable chat file is listed empty; the index is not rewritten."""
+    import os
+
+    good, bad = app._new_chat("Good"), app._new_chat("Bad")
+    bad["id"] += "_bad"
+    app.save_chat_index([good, bad])
+    app.append_message(good["id"], {"role": "assistant", "content": "a1"})
+    os.makedirs(app._chat_file(bad["id"]))
+    with open(app.HISTORY_INDEX, "rb") as f:
+        index = f.read()
+
+    chats = app.load_history()["chats"]
+
+    assert [c["id"] for c in chats] == [good["id"], bad["id"]]
+    assert chats[1]["messages"] == []
+    with open(app.HISTORY_INDEX, "rb") as f:
+        assert f.read() == index
+
+
+def test_load_history_does_not_overwrite_corrupt_index(app, history):
+    """A corrupt index falls back to a fresh chat in memory only."""
+    index = history / "chat_history" / "index.json"
+    index.parent.mkdir()
+    index.write_bytes(b"{not json")
+
+    chats = app.load_history()["chats"]
+
+    assert len(chats) == 1 and chats[0]["messages"] == []
+    assert index.read_bytes() == b"{not json"
@@ -39,3 +39,16 @@ def test_execute_sql_limit():
     sql = "SELECT * FROM users LIMIT 10"
     result = _apply_limit(sql)
     assert result.count("LIMIT") == 1
+
+
+def test_json_adapter_accepts_nan_literals():
+    """Tool payloads with NaN/Infinity literals parse via the stdlib fallback."""
+    import math
+    from agent import _json
+
+    parsed = _json.loads('{"rows": [[NaN, Infinity]]}')
+    assert math.isnan(parsed["rows"][0][0])
+    assert parsed["rows"][0][1] == math.inf
+
+    with pytest.raises(_json.JSONDecodeError):
+        _json.loads("{not json}")